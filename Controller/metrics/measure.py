@@ -1,17 +1,38 @@
 import time
 import os
+import re
+import csv
+import atexit
 import requests
-import pandas as pd
+from collections import defaultdict, deque
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 PROMETHEUS_URL = "http://0.0.0.0:9090"
 
+# Maximum number of metric names folded into a single regex selector,
+# keeps the query string well below typical URL length limits
+QUERY_CHUNK_SIZE = 100
+
+# Number of ticks (seconds) between two refreshes of the metric name list
+METRICS_REFRESH_TICKS = 60
+
+# Reuse one keep-alive connection pool to Prometheus across the polling loop
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+SESSION.headers.update({"Accept-Encoding": "gzip"})
+
+# Worker pool used to issue the chunked queries concurrently,
+# sized to match the session's connection pool
+EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
 def fetch_all_metrics():
     """
     Fetch the list of all metric names from Prometheus.
     """
     url = f"{PROMETHEUS_URL}/api/v1/label/__name__/values"
-    resp = requests.get(url)
+    resp = SESSION.get(url)
     resp.raise_for_status()
     data = resp.json()
     # data["data"] is the list of metric names
@@ -24,12 +45,83 @@ def query_metric(metric_name):
     """
     url = f"{PROMETHEUS_URL}/api/v1/query"
     params = {"query": metric_name}
-    resp = requests.get(url, params=params)
+    resp = SESSION.get(url, params=params)
     resp.raise_for_status()
     data = resp.json()
     # data["data"]["result"] is a list of { "metric": {...}, "value": [timestamp, value] }
     return data["data"].get("result", [])
 
+def build_selectors(metric_names):
+    """
+    Combine the metric names into `{__name__=~"a|b|c"}` selectors, so only one
+    request is needed per QUERY_CHUNK_SIZE metrics instead of one per metric.
+    """
+    return [
+        '{__name__=~"' + "|".join(map(re.escape, metric_names[i:i + QUERY_CHUNK_SIZE])) + '"}'
+        for i in range(0, len(metric_names), QUERY_CHUNK_SIZE)
+    ]
+
+def query_metrics(selectors):
+    """
+    Query the current value of many metrics at once from Prometheus,
+    using the selectors returned by build_selectors.
+    The selectors are queried concurrently to overlap their round-trips.
+    Returns a list of results (each result has 'metric' and 'value' keys).
+    """
+    results = []
+    for chunk_results in EXECUTOR.map(query_metric, selectors):
+        results.extend(chunk_results)
+    return results
+
+# Open CSV handles and writers keyed by instance, kept across ticks
+_writers = {}
+
+def _close_writers():
+    for f, _ in _writers.values():
+        f.close()
+    _writers.clear()
+
+atexit.register(_close_writers)
+
+def _csv_writer(f, fieldnames):
+    return csv.DictWriter(f, fieldnames=fieldnames, restval="", extrasaction="ignore")
+
+def _get_writer(csv_path, instance_name, metrics_dict):
+    """
+    Return the cached (file, DictWriter) pair for an instance, opening the CSV
+    file in append mode and writing its header the first time it is seen.
+    When the instance reports metrics that are not in the header yet, the file is
+    rewritten with the wider header, leaving the new columns empty in the earlier rows.
+    """
+    if instance_name not in _writers:
+        file_exists = os.path.isfile(csv_path)
+        f = open(csv_path, "a", newline="")
+        writer = _csv_writer(f, ["timestamp"] + sorted(metrics_dict))
+        if not file_exists:
+            writer.writeheader()
+        _writers[instance_name] = (f, writer)
+        return f, writer
+
+    f, writer = _writers[instance_name]
+    new_metrics = metrics_dict.keys() - set(writer.fieldnames)
+    if new_metrics:
+        print(f"Adding {len(new_metrics)} new metrics to {csv_path}")
+        f.close()
+        with open(csv_path, newline="") as old:
+            rows = list(csv.DictReader(old))
+        fieldnames = ["timestamp"] + sorted(set(writer.fieldnames[1:]) | new_metrics)
+        # Write the widened copy next to the original, so it is never left half written
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", newline="") as new:
+            widened = _csv_writer(new, fieldnames)
+            widened.writeheader()
+            widened.writerows(rows)
+        os.replace(tmp_path, csv_path)
+        f = open(csv_path, "a", newline="")
+        writer = _csv_writer(f, fieldnames)
+        _writers[instance_name] = (f, writer)
+    return f, writer
+
 def main():
     # Get current time in milliseconds since epoch
     start_time_ms = int(time.time() * 1000)
@@ -40,69 +132,68 @@ def main():
     
     print(f"Saving CSV files to: {folder_path}")
 
-    # Dictionary to hold DataFrames keyed by instance
-    instance_dfs = {}
+    # Dictionary to hold the last 5 (timestamp, metrics) rows keyed by instance
+    instance_dfs = defaultdict(lambda: deque(maxlen=5))
     
-    # Get all metric names once at startup (you could refresh occasionally if needed)
+    # Get all metric names at startup, they are refreshed every METRICS_REFRESH_TICKS ticks
     all_metrics = fetch_all_metrics()
     print(f"Found {len(all_metrics)} metrics total.")
 
     # If you only want certain metrics, filter them here
     # all_metrics = [m for m in all_metrics if m.startswith("cpu_") or m in ("up", "memory_usage")]
 
+    selectors = build_selectors(all_metrics)
+    tick = 0
+
     while True:
         timestamp = datetime.now()
 
+        # Periodically pick up new metrics, only rebuilding the selectors when the list changed
+        tick += 1
+        if tick % METRICS_REFRESH_TICKS == 0:
+            new_metrics = fetch_all_metrics()
+            if new_metrics != all_metrics:
+                all_metrics = new_metrics
+                selectors = build_selectors(all_metrics)
+                print(f"Found {len(all_metrics)} metrics total.")
+
         # Prepare a dict to hold metric -> {instance -> value} for this timestep
         step_data = {}
 
-        for metric_name in all_metrics:
-            results = query_metric(metric_name)
-            for res in results:
-                # Each 'res' is like:
-                # {
-                #   "metric": {"__name__": "cpu_usage", "instance": "11.12.1.2:8080", ...},
-                #   "value": [ <timestamp>, <value_string> ]
-                # }
-                metric_info = res["metric"]
-                value_arr = res["value"]
-                
-                instance_name = metric_info.get("instance", "unknown_instance")
-                mode_name = metric_info.get("mode", "unknown_mode")
-                instance_name = f"{instance_name}_{mode_name}"  # Combine instance and mode for uniqueness
-                # Value array is [unix_timestamp, value_as_string]
-                value = float(value_arr[1])  # Convert to float
-
-                if instance_name not in step_data:
-                    step_data[instance_name] = {}
-                
-                # Assign this metric's value for this instance
-                step_data[instance_name][metric_name] = value
+        for res in query_metrics(selectors):
+            # Each 'res' is like:
+            # {
+            #   "metric": {"__name__": "cpu_usage", "instance": "11.12.1.2:8080", ...},
+            #   "value": [ <timestamp>, <value_string> ]
+            # }
+            metric_info = res["metric"]
+            value_arr = res["value"]
+
+            metric_name = metric_info["__name__"]
+            instance_name = metric_info.get("instance", "unknown_instance")
+            mode_name = metric_info.get("mode", "unknown_mode")
+            instance_name = f"{instance_name}_{mode_name}"  # Combine instance and mode for uniqueness
+            # Value array is [unix_timestamp, value_as_string]
+            value = float(value_arr[1])  # Convert to float
+
+            if instance_name not in step_data:
+                step_data[instance_name] = {}
+
+            # Assign this metric's value for this instance
+            step_data[instance_name][metric_name] = value
         
-        # Insert a row into each instance’s DataFrame
+        # Insert a row into each instance’s history
         for instance_name, metrics_dict in step_data.items():
-            if instance_name not in instance_dfs:
-                instance_dfs[instance_name] = pd.DataFrame()
-
-            # Create a single-row DataFrame for the new data
-            row_df = pd.DataFrame([metrics_dict], index=[timestamp])
-
-            # Append the row to the instance DataFrame (in memory),
-            # but only keep the last 5 rows
-            instance_dfs[instance_name] = pd.concat(
-                [instance_dfs[instance_name], row_df]
-            ).tail(5)
+            # Append the row to the instance history (in memory),
+            # the deque only keeps the last 5 rows
+            instance_dfs[instance_name].append((timestamp, metrics_dict))
 
-            # Write this single new row to CSV (append mode)
+            # Write this single new row to the instance's open CSV file
             csv_name = f"metrics_{instance_name.replace(':','_')}.csv"
             csv_path = os.path.join(folder_path, csv_name)
-            file_exists = os.path.isfile(csv_path)
-            
-            row_df.to_csv(
-                csv_path,
-                mode='a',
-                header=not file_exists
-            )
+            f, writer = _get_writer(csv_path, instance_name, metrics_dict)
+            writer.writerow({"timestamp": str(timestamp), **metrics_dict})
+            f.flush()
 
         print(f"[{timestamp}] Updated {len(step_data)} instances.")
 
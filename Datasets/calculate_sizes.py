@@ -1,26 +1,59 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import os
+import sys
+import json
+import argparse
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 from collections import namedtuple
 import math
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import numpy as np
 
-Stats = namedtuple("Stats", ["size", "count", "sum_sq"])     # total size in bytes, number of files
+Stats = namedtuple("Stats", ["size", "count", "mean", "m2"])  # total size in bytes, number of files,
+                                                              # mean size and sum of squared deviations
 
-def collect(path: Path) -> tuple[Stats, list[str]]:
-    """
-    Post-order DFS.
-    Returns the aggregated Stats for *path* and a list of pretty-printed lines that
-    represent the subtree rooted at *path* (already indented).
-    """
-    indent = "│   "          # what a normal `tree` uses between levels
-    corner = "└── "          # last entry
-    tee    = "├── "          # not-last entry
+Line = namedtuple("Line", ["indent", "branch", "name", "size"])  # one tree entry, size is None
+                                                                # for directories
+EMPTY = Stats(0, 0, 0.0, 0.0)
 
-    total_size = total_count = total_sum_sq = 0
-    lines: list[str] = []
+STAT_BATCH = 128                 # directories with more files have their stat() calls batched
+_stat_pool = ThreadPoolExecutor()  # stat() releases the GIL, so batches overlap their syscalls
 
-    # separate children so we can decide which is the “last” one for pretty printing
+def _stat_sizes(entries: list[os.DirEntry]) -> list[int]:
+    return [e.stat(follow_symlinks=False).st_size for e in entries]
+
+def file_sizes(files: list[os.DirEntry]) -> np.ndarray:
+    """
+    Sizes of *files* in order. Large directories are split into batches of
+    STAT_BATCH entries that are stat()ed concurrently, which keeps many
+    requests in flight on cold caches and network filesystems.
+    """
+    if len(files) <= STAT_BATCH:
+        sizes: Iterable[int] = _stat_sizes(files)
+    else:
+        batches = (files[i:i + STAT_BATCH] for i in range(0, len(files), STAT_BATCH))
+        sizes = chain.from_iterable(_stat_pool.map(_stat_sizes, batches))
+    return np.fromiter(sizes, dtype=np.int64, count=len(files))
+
+def merge(a: Stats, b: Stats) -> Stats:
+    """Combine two Stats with the parallel variant of Welford's algorithm."""
+    count = a.count + b.count
+    if count == 0:
+        return EMPTY
+    delta = b.mean - a.mean
+    mean = a.mean + delta * b.count / count
+    m2 = a.m2 + b.m2 + delta * delta * a.count * b.count / count
+    return Stats(a.size + b.size, count, mean, m2)
+
+def std(st: Stats) -> float:
+    """Population standard deviation of the file sizes."""
+    return math.sqrt(st.m2 / st.count) if st.count else 0
+
+def scan(path: Path) -> tuple[list[os.DirEntry], list[os.DirEntry]]:
+    """Split the entries of *path* into sub-directories and files, sorted by name."""
     dirs, files = [], []
     with os.scandir(path) as it:
         for entry in it:
@@ -30,91 +63,142 @@ def collect(path: Path) -> tuple[Stats, list[str]]:
                 dirs.append(entry)
             elif entry.is_file(follow_symlinks=False):
                 files.append(entry)
+    return sorted(dirs, key=lambda e: e.name), sorted(files, key=lambda e: e.name)
+
+def dir_stats(stats: Stats, files: list[os.DirEntry]) -> tuple[Stats, list[int]]:
+    """Merge the sizes of *files* into *stats*, also returning the individual sizes."""
+    # reduce all sizes at once with NumPy
+    sizes = file_sizes(files)
+    if sizes.size:
+        # deviations from the directory mean, so no sum of squares that can cancel out
+        mean = float(sizes.mean())
+        m2 = float(np.square(sizes - mean).sum())
+        stats = merge(stats, Stats(int(sizes.sum()), int(sizes.size), mean, m2))
+    return stats, sizes.tolist()
+
+def collect(path: Path, stats_map: dict[str, Stats] | None = None,
+            prefix: str = "") -> tuple[Stats, list[Line], dict[str, Stats]]:
+    """
+    Post-order DFS.
+    Returns the aggregated Stats for *path*, a list of Lines that represent the
+    subtree rooted at *path*, and a map from every directory name
+    in the subtree (including *path*) to its Stats.
+    *prefix* is the indentation of the entries directly below *path*; it is shared
+    by all of them and only joined with the entry text when printing.
+    """
+    if stats_map is None:
+        stats_map = {}
 
-    # Process sub-directories first (depth-first)
-    for idx, d in enumerate(sorted(dirs, key=lambda e: e.name)):
-        child_stats, child_lines = collect(Path(d.path))
-        total_size  += child_stats.size
-        total_count += child_stats.count
-        total_sum_sq += child_stats.sum_sq
+    indent = "│   "          # what a normal `tree` uses between levels
+    corner = "└── "          # last entry
+    tee    = "├── "          # not-last entry
+
+    stats = EMPTY
+    lines: list[Line] = []
+
+    # separate children so we can decide which is the “last” one for pretty printing
+    dirs, files = scan(path)
 
-        # adapt indentation of child lines
+    # Process sub-directories first (depth-first)
+    for idx, d in enumerate(dirs):
+        # indentation of the child lines, built once per directory
         branch = tee if idx < len(dirs)-1 or files else corner
-        prefix = branch
-        lines.append(f"{prefix}{d.name}")      # first line for the directory itself
-        last_prefix = indent if idx < len(dirs)-1 or files else "    "
-        lines.extend(last_prefix + line for line in child_lines)
+        child_prefix = prefix + (indent if idx < len(dirs)-1 or files else "    ")
+        child_stats, child_lines, _ = collect(Path(d.path), stats_map, child_prefix)
+        stats = merge(stats, child_stats)
+
+        lines.append(Line(prefix, branch, d.name, None))   # first line for the directory itself
+        lines.extend(child_lines)
 
     # Now account for files in *this* directory
-    for idx, f in enumerate(sorted(files, key=lambda e: e.name)):
-        size = f.stat().st_size
+    stats, sizes = dir_stats(stats, files)
+    for idx, (f, size) in enumerate(zip(files, sizes)):
         #print(f"  {f.name} ({size:,} B)")   # print file size
-        total_size  += size
-        total_count += 1
-        total_sum_sq += size * size
         branch = tee if idx < len(files)-1 else corner
-        lines.append(f"{branch}{f.name} ({size:,} B)")   # file lines won’t appear
-                                                        # in final printing – we’ll
-                                                        # strip them later.
+        lines.append(Line(prefix, branch, f.name, size))   # file lines won’t appear
+                                                          # in final printing – we’ll
+                                                          # strip them later.
 
-    return Stats(total_size, total_count, total_sum_sq), lines
+    # save the aggregate for every directory name encountered
+    # (names are unique inside the parent, which is all we need here)
+    stats_map[path.name] = stats
+    return stats, lines, stats_map
 
 
-def strip_file_lines(lines: list[str]) -> list[str]:
+def collect_stats_only(path: Path, stats_map: dict[str, Stats] | None = None,
+                       rel: str = ".") -> tuple[Stats, dict[str, Stats]]:
+    """
+    Same post-order DFS as collect, without building any tree lines.
+    The returned map is keyed by the directory path relative to the root (*rel*).
+    """
+    if stats_map is None:
+        stats_map = {}
+
+    stats = EMPTY
+    dirs, files = scan(path)
+    for d in dirs:
+        child_stats, _ = collect_stats_only(Path(d.path), stats_map, os.path.join(rel, d.name))
+        stats = merge(stats, child_stats)
+    stats, _ = dir_stats(stats, files)
+
+    stats_map[rel] = stats
+    return stats, stats_map
+
+
+def strip_file_lines(lines: Iterable[Line]) -> Iterator[Line]:
     """Remove the lines that correspond to individual files."""
-    return [ln for ln in lines if not ln.strip().endswith("B)")]
+    return (ln for ln in lines if ln.size is None)
 
 
-def annotate(lines: list[str], stats_map: dict[str, Stats]) -> list[str]:
+def annotate(lines: Iterable[Line], stats_map: dict[str, Stats]) -> Iterator[str]:
     """
     Replace each directory line with:
         ‹dirname›  ——  total: … B, files: …, avg: … B
+    and join it with its indentation, yielding the lines one by one.
     """
-    out = []
     for ln in lines:
-        stripped = ln.lstrip("│ ").lstrip("└── ").lstrip("├── ").rstrip()
-        if stripped in stats_map:            # a directory name
-            st = stats_map[stripped]
-            avg = st.size / st.count if st.count else 0
-            var  = st.sum_sq / st.count - avg * avg if st.count else 0
-            std  = math.sqrt(max(var, 0))
+        if ln.size is not None:              # a file, kept as is
+            yield f"{ln.indent}{ln.branch}{ln.name} ({ln.size:,} B)"
+        elif ln.name in stats_map:           # a directory name, no need to parse the line
+            st = stats_map[ln.name]
+            avg = st.mean
+            dev = std(st)
             avg_kB = avg / 1000
-            std_kB = std / 1000
-            ln = ln.replace(
-                stripped,
-                f"{stripped}  (total: {st.size:,} B, files: {st.count}, "
-                f"avg: {avg:,.1f} B, std: {std:,.1f} B) -> per file: \${avg_kB:,.2f} \\pm {std_kB:,.2f}\$ "
+            std_kB = dev / 1000
+            yield (
+                f"{ln.indent}{ln.branch}{ln.name}  (total: {st.size:,} B, files: {st.count}, "
+                f"avg: {avg:,.1f} B, std: {dev:,.1f} B) -> per file: \${avg_kB:,.2f} \\pm {std_kB:,.2f}\$ "
             )
-        out.append(ln)
-    return out
+        else:
+            yield f"{ln.indent}{ln.branch}{ln.name}"
 
 
-def main(root_dir: str = "."):
-    root = Path(root_dir).resolve()
-    stats_map: dict[str, Stats] = {}
+def main():
+    # Set up argument parser
+    parser = argparse.ArgumentParser(description="Print the size statistics of every directory in a tree.")
+    parser.add_argument('-d', '--directory', type=str, default=".", help="Root directory to scan (default: current directory).")
+    parser.add_argument('-f', '--format', type=str, choices=["tree", "ndjson"], default="tree", help="Output format: annotated 'tree' (default) or one JSON object per directory 'ndjson'.")
+    args = parser.parse_args()
 
-    root_stats, subtree_lines = collect(root)
-    # save the aggregate for every directory name encountered once
-    # (names are unique inside the parent, which is all we need here)
-    for path, _, files in os.walk(root):
-        here = Path(path)
-        sizes = [f.stat().st_size for f in here.glob("**/*") if f.is_file()]
-        stats_map[here.name] = Stats(
-            sum(sizes), len(sizes), sum(s * s for s in sizes)
-        )
+    root = Path(args.directory).resolve()
+
+    if args.format == "ndjson":
+        # numbers only, straight from the stats map
+        _, stats_map = collect_stats_only(root)
+        for p, st in stats_map.items():
+            json.dump({"path": p, **st._asdict(), "std": std(st)}, sys.stdout)
+            sys.stdout.write("\n")
+        return
 
-    # build the textual tree without file entries, then annotate
-    dir_lines = strip_file_lines(subtree_lines)
-    final_lines = annotate(dir_lines, stats_map)
+    root_stats, subtree_lines, stats_map = collect(root)
 
+    # stream the textual tree without file entries, annotated, straight to stdout
     print(f"{root.name}/")                    # root line
-    for l in final_lines:
-        print(l)
+    sys.stdout.writelines(l + "\n" for l in annotate(strip_file_lines(subtree_lines), stats_map))
 
     # Top-level summary
-    avg_root = root_stats.size / root_stats.count if root_stats.count else 0
-    var_root = root_stats.sum_sq / root_stats.count - avg_root * avg_root if root_stats.count else 0
-    std_root = math.sqrt(max(var_root, 0))
+    avg_root = root_stats.mean
+    std_root = std(root_stats)
 
     print("\nSummary for '.', including all sub-folders:")
     print(f"  total size : {root_stats.size:,} bytes")
@@ -1,16 +1,26 @@
 import open3d as o3d
 import numpy as np
 import os
+import shutil
 import pathlib
 from tqdm import tqdm
 import argparse
-
-# Function to downsample a ply file and save it
-def downsample_ply_file(input_file, output_file, percentage=100.0, target_num_pts=None, method="farthest"):
-    # Load the point cloud
-    pcd = o3d.io.read_point_cloud(input_file)
-
-    current_num_pts = np.asarray(pcd.points).shape[0]
+import functools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Function to load a ply file as a tensor point cloud with float32 attributes
+# Halving the bytes per coordinate speeds up the distance computations of the samplers
+def read_ply_file(input_file):
+    pcd = o3d.t.io.read_point_cloud(input_file)
+    for key, value in list(pcd.point.items()):
+        # Cast positions, normals and float colors, integer attributes are kept as is
+        if value.dtype == o3d.core.float64:
+            pcd.point[key] = value.to(o3d.core.float32)
+    return pcd
+
+# Function to downsample an already loaded tensor point cloud and save it as a ply file
+def downsample_ply_file(pcd, output_file, percentage=100.0, target_num_pts=None, method="farthest"):
+    current_num_pts = pcd.point.positions.shape[0]
     
     # Calculate the target number of points based on the percentage if target_num_pts is not provided
     if target_num_pts is None:
@@ -26,33 +36,65 @@ def downsample_ply_file(input_file, output_file, percentage=100.0, target_num_pt
         # Calculate the sampling ratio for random downsampling
         sampling_ratio = (target_num_pts * 1.0) / current_num_pts
         downpcd = pcd.random_down_sample(sampling_ratio)
+    elif method == "voxel":
+        # Estimate the voxel size from the bounding box diagonal, assuming the points
+        # lie on a surface (points ~ diagonal^2 / voxel_size^2), this is O(N) but only
+        # approximates the target number of points
+        diagonal = np.linalg.norm(pcd.get_axis_aligned_bounding_box().get_extent().numpy())
+        voxel_size = diagonal / np.sqrt(max(target_num_pts, 1))
+        downpcd = pcd.voxel_down_sample(voxel_size)
+    elif method == "farthest_gpu":
+        # Run farthest point sampling on the GPU,
+        # this requires an open3d build with CUDA support
+        downpcd = pcd.to(o3d.core.Device("CUDA:0")).farthest_point_down_sample(target_num_pts).cpu()
     else:
         raise ValueError(f"Unsupported downsampling method: {method}")
 
     # Write the downsampled point cloud to file
-    o3d.io.write_point_cloud(output_file, downpcd)
+    o3d.t.io.write_point_cloud(output_file, downpcd)
+
+# Worker that reads a single input file once and writes all of its downsampled outputs
+def _work(job, method):
+    input_file, outputs = job
+    pcd = read_ply_file(input_file)
+    for output_file, percentage, target_num_pts in outputs:
+        downsample_ply_file(pcd, output_file, percentage, target_num_pts, method)
 
 # Function to process a directory and downsample ply files
-def process_directory(base_dir, percentage=100.0, target_num_pts=None, method="farthest"):
+# Both percentage and target_num_pts accept a single value or a list of values,
+# every ply file is read once and downsampled to each of the requested targets
+# workers defaults to one process per CPU, or a single process for 'farthest_gpu',
+# as every process would otherwise create its own CUDA context on the same GPU
+def process_directory(base_dir, percentage=100.0, target_num_pts=None, method="farthest", workers=None):
     if percentage is None and target_num_pts is None:
         raise ValueError("Either percentage or target number of points must be provided.")
 
-    # Check if the percentage is valid
-    if percentage < 0.0 or percentage > 100.0:
-        raise ValueError("Percentage must be between 0 and 100.")
+    # Build the list of (percentage, target number of points) targets
+    if target_num_pts is not None:
+        targets = [(None, n) for n in (target_num_pts if isinstance(target_num_pts, (list, tuple)) else [target_num_pts])]
+    else:
+        targets = [(p, None) for p in (percentage if isinstance(percentage, (list, tuple)) else [percentage])]
+
+    for pct, pts in targets:
+        # Check if the percentage is valid
+        if pct is not None and (pct < 0.0 or pct > 100.0):
+            raise ValueError("Percentage must be between 0 and 100.")
 
-    if target_num_pts is not None and target_num_pts <= 0:
-        raise ValueError("Target number of points must be positive.")
+        if pts is not None and pts <= 0:
+            raise ValueError("Target number of points must be positive.")
 
     datasets = []
 
-    # Create a list to store the input-output file pairs
-    file_pairs = []
+    # Map every input file to the list of (output file, percentage, target number of points) it produces
+    file_jobs = {}
 
     # First collect all the datasets in the base directory that have a 'Ply' folder
     for root, dirs, files in os.walk(base_dir):
         if 'Ply' in dirs:
             datasets.append(root)
+        # Prune the walk in-place: don't descend into the 'Ply' folders (handled below)
+        # nor into previously generated outputs, so we never sample our own results
+        dirs[:] = [d for d in dirs if d != 'Ply' and not d.startswith('Ply_pct_') and not d.startswith('Ply_pts_')]
 
     print(f"Found {len(datasets)} datasets with 'Ply' folders.")
         
@@ -60,37 +102,41 @@ def process_directory(base_dir, percentage=100.0, target_num_pts=None, method="f
     # Here we already know that each dataset has a 'Ply' folder
     # Search for all the ply files and add them to the list
     for dataset in sorted(datasets):
-            ply_dir = os.path.join(dataset, 'Ply')
+        ply_dir = os.path.join(dataset, 'Ply')
 
+        for pct, pts in targets:
             # Make the output directory path
-            output_dir = os.path.join(dataset, f'Ply_pct_{int(percentage)}') if target_num_pts is None else os.path.join(dataset, f'Ply_pts_{int(target_num_pts)}') 
-
-            # Create the output directory if it doesn't exist
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            else:
-                # Clear the output directory if it already exists
-                for file_name in os.listdir(output_dir):
-                    file_path = os.path.join(output_dir, file_name)
-                    if os.path.isfile(file_path):
-                        os.remove(file_path)
+            output_dir = os.path.join(dataset, f'Ply_pct_{int(pct)}') if pts is None else os.path.join(dataset, f'Ply_pts_{int(pts)}')
+
+            # Clear the output directory if it already exists, then (re)create it
+            if os.path.exists(output_dir):
+                shutil.rmtree(output_dir)
+            os.makedirs(output_dir, exist_ok=True)
 
             # Sort the ply files in the directory
-            # Iterate over each ply file in the Ply folder and add it to the list
+            # Iterate over each ply file in the Ply folder and add its output to the list
             for file_name in sorted(os.listdir(ply_dir)):
                 if file_name.endswith(".ply"):
                     input_file = os.path.join(ply_dir, file_name)
                     output_file = os.path.join(output_dir, file_name)
-                    file_pairs.append((input_file, output_file))
-
-    # Now process the file pairs with a progress bar
-    for input_file, output_file in tqdm(file_pairs, desc="Downsampling PLY files", unit="file"):
-        try:
-            downsample_ply_file(input_file, output_file, percentage, target_num_pts, method)
-        except Exception as e:
-            print(f"Error processing {input_file}")
-            # Throw the exception to stop the processing
-            raise e
+                    file_jobs.setdefault(input_file, []).append((output_file, pct, pts))
+
+    # Now process the input files in parallel with a progress bar
+    # Each file is independent, so every worker process handles whole files
+    work = functools.partial(_work, method=method)
+    if workers is None:
+        workers = 1 if method == "farthest_gpu" else os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(work, job): job for job in file_jobs.items()}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Downsampling PLY files", unit="file"):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error processing {futures[future][0]}")
+                # Cancel the pending files and throw the exception to stop the processing
+                for pending in futures:
+                    pending.cancel()
+                raise e
 
 
 def main():
@@ -101,13 +147,16 @@ def main():
     parser.add_argument('-d', '--directory', type=str, default=pathlib.Path(__file__).parent.resolve(), help="Root directory to scan for 'Ply' folders.")
 
     # Add argument for percentage-based downsampling
-    parser.add_argument('-p', '--percentage', type=float, default=100.0, help="Percentage of points to keep (default: 100%).")
+    parser.add_argument('-p', '--percentage', type=float, nargs='+', default=100.0, help="Percentage(s) of points to keep (default: 100%%).")
 
     # Add argument for downsampling to a target number of points
-    parser.add_argument('-n', '--num_points', type=int, default=None, help="Target number of points to downsample to. Overrides percentage if provided.")
+    parser.add_argument('-n', '--num_points', type=int, nargs='+', default=None, help="Target number(s) of points to downsample to. Overrides percentage if provided.")
 
     # Add argument for downsampling method
-    parser.add_argument('-m', '--method', type=str, choices=["farthest", "random"], default="farthest", help="Downsampling method: 'farthest' (default) or 'random'.")
+    parser.add_argument('-m', '--method', type=str, choices=["farthest", "random", "voxel", "farthest_gpu"], default="farthest", help="Downsampling method: 'farthest' (default), 'random', 'voxel' (fast, approximate point count) or 'farthest_gpu' (requires open3d with CUDA).")
+
+    # Add argument for the number of worker processes
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Number of worker processes (default: one per CPU, or 1 for 'farthest_gpu').")
 
     # Parse the arguments
     args = parser.parse_args()
@@ -115,7 +164,7 @@ def main():
     # Determine the root directory (from argument)
     root_directory = pathlib.Path(args.directory).resolve()
 
-    process_directory(root_directory, percentage=args.percentage, target_num_pts=args.num_points, method=args.method)
+    process_directory(root_directory, percentage=args.percentage, target_num_pts=args.num_points, method=args.method, workers=args.workers)
 
 if __name__ == "__main__":
     main()
@@ -3,67 +3,163 @@
 import json
 import os
 import random
+import re
+import selectors
+import shutil
+import signal
 import subprocess
 import sys
 import threading
 import traceback
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import parse_qs, urlparse
 from mininet.clean import cleanup
 from mininet.net import Mininet
 from mininet.link import TCLink
 from mininet.log import setLogLevel, info
 from mininet.util import sysctlTestAndSet
-from topology import NetworkTopo
+from topology import NetworkTopo, ParallelMininet
+from nodes import ip_batch
 import networkx as nx
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use("Agg") # Never start a GUI backend, networkx imports pyplot when drawing
 import matplotlib.colors as mcolors
+from matplotlib.figure import Figure
 from io import BytesIO
 from PIL import Image
 
+try:
+    import orjson # Optional, a faster JSON implementation
+except ImportError:
+    orjson = None
+
+class ReadWriteLock:
+    """A lock that allows many concurrent readers or a single exclusive writer.
+    Waiting writers go first, so polling readers can't starve a start/stop."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        """Acquire the lock shared with other readers."""
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Acquire the lock exclusively."""
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 net = None # We store the Mininet network globaly.
-lock = threading.Lock()  # Global lock for sequential processing
+lock = ReadWriteLock()  # Exclusive for routes that start/stop the network, shared for all others
+cmd_lock = threading.Lock()  # Serializes node.cmd calls from shared routes, Mininet's Node.cmd is not reentrant
+plot_lock = threading.Lock()  # matplotlib is not thread-safe, so only one figure is drawn at a time
+EXEC_FLUSH_SIZE = 32 * 1024  # Buffered /exec output is sent once it reaches this many bytes
+exec_processes = set()  # Children of streaming /exec requests, killed when the network stops
+exec_processes_lock = threading.Lock()
+
+VISUALIZATION_CACHE_SIZE = 8  # Number of rendered topologies kept by /visualize
+visualization_cache = OrderedDict()  # Topology key -> PNG buffer, in least recently used order
+visualization_cache_lock = threading.Lock()
+VISUALIZATION_FIG = Figure(figsize=(24, 8))  # Reused by every /visualize rendering, guarded by plot_lock
+VISUALIZATION_AX = VISUALIZATION_FIG.add_axes((0, 0, 1, 1))  # The same full-figure axes nx.draw creates on an empty figure
 
 class SimpleRouter:
     """A simple router to handle path-based requests with HTTP method support."""
 
     def __init__(self):
-        self.routes = {}
-
-    def route(self, path, methods=["GET"]):
-        """Decorator to register a route with specified HTTP methods."""
+        # One table per HTTP method, keyed by path only, so dispatch is a single string lookup
+        self.get_routes = {}
+        self.post_routes = {}
+        # HEAD requests are answered by looking at the GET routes
+        self._method_tables = {"GET": self.get_routes, "POST": self.post_routes, "HEAD": self.get_routes}
+        # Routes are registered at import time, so their summaries are built once and reused
+        self._routes_info_cache = None
+        self._endpoints_cache = None
+
+    def route(self, path, methods=["GET"], exclusive=False, unlocked=False):
+        """Decorator to register a route with specified HTTP methods.
+        Exclusive routes run alone, the others may run concurrently with each other.
+        Unlocked routes take the shared lock themselves, only for as long as they use the network."""
+        acquire = lock.write if exclusive else nullcontext if unlocked else lock.read
         def decorator(func):
             for method in methods:
-                self.routes[(path, method)] = func
+                if method not in ("GET", "POST"):
+                    raise ValueError(f"Unsupported HTTP method '{method}'")
+                self._method_tables[method][path] = (func, acquire)
+            self._routes_info_cache = None
+            self._endpoints_cache = None
             return func
         return decorator
 
     def get_handler(self, path, method):
-        """Retrieve the handler function for a given path and method."""
-        return self.routes.get((path, method), None)
+        """Retrieve the (handler function, lock to hold) pair for a given path and method."""
+        return self._method_tables[method].get(path)
 
     def get_routes_info(self):
         """Returns a summary of all registered routes."""
-        route_info = {}
-        for (path, method), handler in self.routes.items():
-            route_info.setdefault(path, []).append(method)
-        return route_info
+        if self._routes_info_cache is None:
+            route_info = {}
+            for method, routes in (("GET", self.get_routes), ("POST", self.post_routes)):
+                for path in routes:
+                    route_info.setdefault(path, []).append(method)
+            self._routes_info_cache = route_info
+        return self._routes_info_cache
+
+    def get_endpoints(self):
+        """Returns the registered routes as a list of {"path", "methods"} entries."""
+        if self._endpoints_cache is None:
+            self._endpoints_cache = [{"path": path, "methods": methods} for path, methods in self.get_routes_info().items()]
+        return self._endpoints_cache
 
 router = SimpleRouter()
 
+# Pre-encoded parts of a JSON response, only the status line, length and body change per response
+STATUS_LINES = {code: b"HTTP/1.1 %d %s\r\n" % (code, phrase.encode("latin-1"))
+                for code, (phrase, _) in BaseHTTPRequestHandler.responses.items()}
+JSON_RESPONSE_HEADERS = b"Content-Type: application/json\r\nContent-Length: "
+
 class RequestHandler(BaseHTTPRequestHandler):
-    protocol_version = 'HTTP/1.1' # Required to support chunked responses
+    protocol_version = 'HTTP/1.1' # Required to support chunked responses, and keeps connections alive between requests
+    timeout = 30 # Idle keep-alive connections are closed after this many seconds, which frees their worker
+    chunked_started = False # Set once the headers of a chunked response have been sent
 
     def do_HEAD(self):
         """Serve a HEAD request."""
-        parsed_path = urlparse(self.path)
-        handler = router.get_handler(parsed_path.path, "GET")
+        self.parsed_path = urlparse(self.path)
+        handler = router.get_handler(self.parsed_path.path, "HEAD")
         if not handler:
             self.send_response(404)
         else:
             self.send_response(200)
             #self.send_header("Content-Type", "application/json")
-        self.send_header("Connection", "close") # We don't support persistent connections
         self.end_headers()
 
     def do_GET(self):
@@ -74,61 +170,73 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def _handle_request(self, method):
         """Handle an HTTP request by finding the appropriate route handler."""
-        parsed_path = urlparse(self.path)
-        handler = router.get_handler(parsed_path.path, method)
-
-        if handler:
-            query_params = parse_qs(parsed_path.query)
-            body = self._parse_body()
+        self.parsed_path = urlparse(self.path) # Parsed once, handlers can reuse it
+        self.chunked_started = False # The connection is reused, so this is reset for each request
+        route = router.get_handler(self.parsed_path.path, method)
+        # Always consume the body, otherwise it would be read as the next request on this connection
+        body = self._parse_body()
+
+        if route:
+            handler, acquire = route
+            query_params = parse_qs(self.parsed_path.query)
             try:
-                with lock:
+                with acquire():
                     handler(self, query_params, body)
             except Exception as e:
-                self._send_response(500, {"error": str(e)})
+                self._send_error_response(e)
         else:
             self._send_response(404, {"error": "Not found"})
 
     def _parse_body(self):
         """Parse JSON body if present."""
-        if 'Content-Length' in self.headers:
-            length = int(self.headers['Content-Length'])
-            body = self.rfile.read(length)
-            try:
-                return json.loads(body)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length == 0:
+            return {} # Nothing to read, e.g. for GET requests
+        body = self.rfile.read(length)
+        try:
+            return orjson.loads(body) if orjson else json.loads(body)
+        except ValueError: # Both json.JSONDecodeError and orjson.JSONDecodeError
+            return {}
 
     def _send_response(self, code, message):
-        """Send a JSON response."""
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Connection", "close") # We don't support persistent connections
-        self.end_headers()
-        self.wfile.write(json.dumps(message).encode("utf-8"))
+        """Send a JSON response, status line, headers and body in a single write."""
+        # orjson produces bytes directly, the stdlib fallback still has to encode
+        body = orjson.dumps(message) if orjson else json.dumps(message).encode("utf-8")
+        self.log_request(code)
+        self.wfile.write(b"%s%s%d\r\n\r\n%s" % (STATUS_LINES[code], JSON_RESPONSE_HEADERS, len(body), body))
+
+    def _send_error_response(self, error):
+        """Send the error as a 500 response, unless a chunked response was already started.
+        Its status and framing can't change any more, so the connection is closed without
+        ending the body instead, which tells the client the response is incomplete."""
+        if self.chunked_started:
+            self.close_connection = True
+        else:
+            self._send_response(500, {"error": str(error)})
 
     def _send_chunked_start(self):
         """Start a chunked response."""
         self.send_response(200)
         #self.send_header("Content-Type", "application/json")
         self.send_header("Transfer-Encoding", "chunked")
-        self.send_header("Connection", "close") # We don't support persistent connections
         self.end_headers()
+        self.chunked_started = True
 
     def _send_chunk(self, chunk):
-        """Send a single chunk."""
+        """Send a single chunk (str or bytes) with one write."""
         if not chunk or len(chunk) == 0:
             return # Skip empty chunks, as that would end the response
-        self.wfile.write(f"{len(chunk):X}\r\n".encode("utf-8"))
-        self.wfile.write(chunk.encode("utf-8"))
-        self.wfile.write(b"\r\n")
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        # The chunk size is the number of bytes, so it is computed after encoding
+        self.wfile.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
 
     def _send_chunked_end(self):
         """End the chunked response."""
         self.wfile.write(b"0\r\n\r\n")
 
 # Route definitions
-@router.route("/start", methods=["GET"])
+@router.route("/start", methods=["GET"], exclusive=True)
 def start_network(request_handler=None, query_params=None, body=None) -> Mininet:
     """Start the Mininet network."""
     global net
@@ -139,6 +247,8 @@ def start_network(request_handler=None, query_params=None, body=None) -> Mininet
 
     try:
         info("Starting Mininet network")
+        with visualization_cache_lock:
+            visualization_cache.clear()
         cleanup()
         info("Clean up done")
 
@@ -147,7 +257,7 @@ def start_network(request_handler=None, query_params=None, body=None) -> Mininet
 
         topo = NetworkTopo(**topo_kwargs)
         info("Topology created with parameters:", topo_kwargs)
-        net = Mininet(topo=topo, link=TCLink)
+        net = ParallelMininet(topo=topo, link=TCLink) # Configures the routers and edge nodes concurrently
         net.start()
         info("Network started")
 
@@ -159,37 +269,40 @@ def start_network(request_handler=None, query_params=None, body=None) -> Mininet
         sysctlTestAndSet( 'net.ipv4.tcp_wmem', '20480 349520 67108864' )
         sysctlTestAndSet( 'net.core.netdev_max_backlog', 20000 )
 
+        # Look every host and switch up by name once, instead of going through net[...] for each of them
+        hosts_by_name = {host.name: host for host in net.hosts}
+        switches_by_name = {switch.name: switch for switch in net.switches}
+
         info('*** Routing Table on NAT Router:\n')
-        info(net['r1'].cmd('route'))
+        info(hosts_by_name['r1'].cmd('route'))
 
         # Get the number of nodes that start with 'nDIGIT'
-        n_nodes = len([node for node in net.hosts if node.name.startswith('n') and node.name[1:].isdigit()])
+        n_nodes = sum(1 for name in hosts_by_name if name.startswith('n') and name[1:].isdigit())
         # Get the number of routers that start with 'rDIGIT' (excluding the NAT router [r1])
-        n_routers = len([node for node in net.hosts if node.name.startswith('r') and node.name[1:].isdigit() and node.name != 'r1'])
+        n_routers = sum(1 for name in hosts_by_name if name.startswith('r') and name[1:].isdigit() and name != 'r1')
         # Get the number of switches that start with 'sDIGIT'
         n_switches = len([node for node in topo.switches() if node.startswith('s') and node[1:].isdigit()])
         info(f"Number of nodes: {n_nodes}, routers: {n_routers}, switches: {n_switches}")
         
-        nat = net['nat0']
+        nat = hosts_by_name['nat0']
         # Search for the interface that is connected to the NAT router
-        nat_intf = [intf for intf in nat.intfList() if intf.IP().startswith('11.0.')][0]
+        nat_intf = next(intf for intf in nat.intfList() if intf.IP().startswith('11.0.'))
         # We need to set the routes for the NAT router, we have to redirect all outside traffic to the nat router
-        for n in range(1, n_nodes+1):
-            info(nat.cmd(f'ip route add 11.0.{n}.0/24 via 11.0.{n_nodes+1}.1 dev {nat_intf}'))
+        nat_routes = [f'route add 11.0.{n}.0/24 via 11.0.{n_nodes+1}.1 dev {nat_intf}' for n in range(1, n_nodes+1)]
+        nat_routes += [f'route add 11.{10 + n + 1}.1.0/24 via 11.0.{n_nodes+1}.1 dev {nat_intf}' for n in range(1, n_routers+1)]
+        info(ip_batch(nat, nat_routes))
 
         for n in range(1, n_routers+1):
-            # We need to set the routes for the NAT router, we have to redirect all outside traffic to the nat router
-            info(nat.cmd(f'ip route add 11.{10 + n + 1}.1.0/24 via 11.0.{n_nodes+1}.1 dev {nat_intf}'))
-
             # We need to set the other way around as well, so the routers know how to reach the nat router
-            router = net[f'r{n+1}']
-            router_to_nat_intf = [intf for intf in router.intfList() if intf.IP().startswith(f'11.{10 + n + 1}.')][0]
+            router = hosts_by_name[f'r{n+1}']
+            router_prefix = f'11.{10 + n + 1}.'
+            router_to_nat_intf = next(intf for intf in router.intfList() if intf.IP().startswith(router_prefix))
             info(router.cmd(f'ip route add 11.0.{n_nodes+1}.0/24 via 11.{10 + n + 1}.1.1 dev {router_to_nat_intf}'))
 
         # Make all the switches do L2 forwarding
         # We skip the first switch, as that is just to our NAT router
         for n in range(1, n_switches):
-            switch = net[f's{n}']
+            switch = switches_by_name[f's{n}']
             info(switch.cmd(f'ovs-ofctl add-flow {switch} " cookie=0x0, priority=0 actions=NORMAL" -O OpenFlow13'))
             
 
@@ -203,7 +316,7 @@ def start_network(request_handler=None, query_params=None, body=None) -> Mininet
     
     return net
 
-@router.route("/stop", methods=["GET"])
+@router.route("/stop", methods=["GET"], exclusive=True)
 def stop_network(request_handler=None, query_params=None, body=None) -> bool:
     """Stop the Mininet network."""
     global net
@@ -213,7 +326,10 @@ def stop_network(request_handler=None, query_params=None, body=None) -> bool:
         return True
     
     info("Stopping Mininet network")
+    with visualization_cache_lock:
+        visualization_cache.clear()
     try:
+        _kill_exec_processes()  # Streaming /exec requests would otherwise keep running in the stopped network
         net.stop()
         cleanup()
         net = None
@@ -230,57 +346,100 @@ def stop_network(request_handler=None, query_params=None, body=None) -> bool:
     
     return False
 
-@router.route("/exec", methods=["GET"])
+def _kill_exec_process(proc):
+    """Kill an /exec child together with the processes it started."""
+    if proc.poll() is None:
+        try:
+            # mnexec -d puts the child in its own session, so its process group holds everything it started
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass # Exited in the meantime
+
+def _kill_exec_processes():
+    """Kill the children of all streaming /exec requests, which ends their streams."""
+    with exec_processes_lock:
+        for proc in exec_processes:
+            _kill_exec_process(proc)
+
+@router.route("/exec", methods=["GET"], unlocked=True)
 def execute_command(request_handler=None, query_params=None, body=None) -> bool:
     """Execute a command on a given node and stream output."""
     global net
-    if net is None:
-        if request_handler:
-            request_handler._send_response(400, {"message": "Network is not running"})
-        return False
-    
     # Parse node and command from query parameters
     node_name = query_params.get("node", [None])[0]
     command = query_params.get("command", [None])[0]
     background = query_params.get("background", ["false"])[0].lower() == "true"
 
-    info(f"Executing command '{command}' on node '{node_name}'")
-
-    if not node_name or not command:
-        if request_handler:
-            request_handler._send_response(400, {"message": "Missing node or command parameter"})
-        return False
-
+    proc = None
     try:
-        node = net.get(node_name)
-        if background:
-            # Ensure the command ends with '&' for background execution
-            if not command.strip().endswith("&"):
-                command += " &"
-
-            # Execute the command
-            node.cmd(command)
-
-            if request_handler:
-                request_handler._send_response(200, {"message": f"Background command executed on node '{node_name}'"})
-            return True
+        # The shared lock is only held while the child is started, streaming its output
+        # happens without it, so a long running command can't hold up /stop or /start
+        with lock.read():
+            if net is None:
+                if request_handler:
+                    request_handler._send_response(400, {"message": "Network is not running"})
+                return False
+
+            info(f"Executing command '{command}' on node '{node_name}'")
+
+            if not node_name or not command:
+                if request_handler:
+                    request_handler._send_response(400, {"message": "Missing node or command parameter"})
+                return False
+
+            node = net.get(node_name)
+            if background:
+                # Ensure the command ends with '&' for background execution
+                if not command.strip().endswith("&"):
+                    command += " &"
+
+                # Execute the command
+                with cmd_lock:
+                    node.cmd(command)
+
+                if request_handler:
+                    request_handler._send_response(200, {"message": f"Background command executed on node '{node_name}'"})
+                return True
+
+            # Execute command and stream output in chunks
+            proc = node.popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            with exec_processes_lock:
+                exec_processes.add(proc)
 
         if request_handler:
             request_handler._send_chunked_start()
 
-        # Execute command and stream output in chunks
-        proc = node.popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        while True:
-            output = proc.stdout.readline()
-            if output and request_handler:
-                request_handler._send_chunk(output)
-            elif proc.poll() is not None:
-                break
-
-        # Send any remaining output from stderr
-        err_output = proc.stderr.read()
-        if err_output and request_handler:
-            request_handler._send_chunk(err_output)
+        with selectors.DefaultSelector() as selector:
+            # Wait on both pipes, so a silent child doesn't make us spin
+            # and a full stderr pipe can't block the child
+            for pipe in (proc.stdout, proc.stderr):
+                selector.register(pipe, selectors.EVENT_READ)
+
+            # The raw output is buffered and sent as one HTTP chunk when it grows
+            # large enough or when the child goes idle, instead of one chunk per read
+            pending = bytearray()
+            while selector.get_map():
+                events = selector.select(timeout=0)
+                if not events:
+                    if pending and request_handler:
+                        request_handler._send_chunk(pending)
+                    pending.clear()
+                    events = selector.select()
+                for key, _ in events:
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        pending += data
+                    else:
+                        selector.unregister(key.fileobj) # EOF
+                if len(pending) >= EXEC_FLUSH_SIZE:
+                    # Only send completed lines, a partial last line waits for the rest of it
+                    end = pending.rfind(b"\n") + 1 or len(pending)
+                    if request_handler:
+                        request_handler._send_chunk(pending[:end])
+                    del pending[:end]
+            if pending and request_handler:
+                request_handler._send_chunk(pending)
+        proc.wait()
 
         if request_handler:
             request_handler._send_chunked_end()
@@ -288,19 +447,52 @@ def execute_command(request_handler=None, query_params=None, body=None) -> bool:
         return True
     except Exception as e:
         if request_handler:
-            request_handler._send_response(500, {"error": str(e)})
+            request_handler._send_error_response(e)
         return False
+    finally:
+        if proc is not None:
+            with exec_processes_lock:
+                exec_processes.discard(proc)
+            _kill_exec_process(proc) # Still running if its output could not be delivered, e.g. the client went away
+            proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
 
 @router.route("/endpoints", methods=["GET"])
 def list_endpoints(request_handler=None, query_params=None, body=None) -> list:
     """List all registered endpoints with their methods."""
-    routes_info = router.get_routes_info()
-    formatted_routes = [{"path": path, "methods": methods} for path, methods in routes_info.items()]
+    formatted_routes = router.get_endpoints()
     if request_handler:
         request_handler._send_response(200, formatted_routes)
     
     return formatted_routes
 
+def _snapshot_nodes() -> list:
+    """Describe the nodes of the running network."""
+    return [{"name": node.name, "type": node.__class__.__name__} for node in net.values()]
+
+def _snapshot_links() -> list:
+    """Describe the links of the running network."""
+    links = []
+    for link in net.links:
+        intf1, intf2 = link.intf1, link.intf2
+        # Retrieve IP addresses of both interfaces, if they exist
+        ip1, ip2 = intf1.IP(), intf2.IP()
+        links.append({
+            "node1": intf1.node.name,
+            "intf1": intf1.name,
+            "ip1": ip1 if ip1 is not None else "N/A",
+            "node2": intf2.node.name,
+            "intf2": intf2.name,
+            "ip2": ip2 if ip2 is not None else "N/A",
+            "status": "up" if link.status() == "(OK OK)" else "down"
+        })
+    return links
+
+def _snapshot_network() -> dict:
+    """Walk the running network once and describe its nodes and links."""
+    return {"nodes": _snapshot_nodes(), "links": _snapshot_links()}
+
 @router.route("/nodes", methods=["GET"])
 def list_nodes(request_handler=None, query_params=None, body=None) -> list:
     """Lists the nodes in the network."""
@@ -312,7 +504,7 @@ def list_nodes(request_handler=None, query_params=None, body=None) -> list:
     
     info("Getting all the nodes in the Mininet network")
     try:
-        nodes = [{"name": node.name, "type": type(node).__name__} for node in net.values()]
+        nodes = _snapshot_nodes()
         if request_handler:
             request_handler._send_response(200, nodes)
         return nodes
@@ -332,20 +524,7 @@ def list_links(request_handler=None, query_params=None, body=None) -> list:
     
     info("Getting all the links in the Mininet network")
     try:
-        links = []
-        for link in net.links:
-            # Retrieve IP addresses of both interfaces, if they exist
-            ip1 = link.intf1.IP() if link.intf1.IP() is not None else "N/A"
-            ip2 = link.intf2.IP() if link.intf2.IP() is not None else "N/A"
-            links.append({
-                "node1": link.intf1.node.name,
-                "intf1": link.intf1.name,
-                "ip1": ip1,
-                "node2": link.intf2.node.name,
-                "intf2": link.intf2.name,
-                "ip2": ip2,
-                "status": "up" if link.status() == "(OK OK)" else "down"
-            })
+        links = _snapshot_links()
         if request_handler:
             request_handler._send_response(200, links)
         return links
@@ -365,15 +544,14 @@ def network_status(request_handler=None, query_params=None, body=None) -> dict:
     
     try:
         # Basic network info
-        nodes = list_nodes(None, query_params, body)
-        links = list_links(None, query_params, body)
+        snapshot = _snapshot_network()
 
         status = {
             "status": "running",
-            "nodes": nodes,
-            "links": links,
-            "node_count": len(nodes),
-            "link_count": len(links),
+            "nodes": snapshot["nodes"],
+            "links": snapshot["links"],
+            "node_count": len(snapshot["nodes"]),
+            "link_count": len(snapshot["links"]),
         }
 
         if request_handler:
@@ -384,6 +562,24 @@ def network_status(request_handler=None, query_params=None, body=None) -> dict:
             request_handler._send_response(500, {"error": str(e)})
         return {"status": "error"}
 
+def _visualization_key(status):
+    """A hashable key describing everything the visualization depends on."""
+    nodes = tuple(sorted((node["name"], node["type"]) for node in status["nodes"]))
+    links = tuple(sorted(
+        (link["node1"], link["intf1"], link["ip1"], link["node2"], link["intf2"], link["ip2"], link["status"])
+        for link in status["links"]
+    ))
+    return nodes, links
+
+def _send_png(request_handler, png):
+    """Send a PNG image as a response."""
+    if request_handler:
+        request_handler.send_response(200)
+        request_handler.send_header("Content-Type", "image/png")
+        request_handler.send_header("Content-Length", str(len(png)))
+        request_handler.end_headers()
+        request_handler.wfile.write(png)
+
 @router.route("/visualize", methods=["GET"])
 def visualize_network(request_handler=None, query_params=None, body=None):
     """Generate a network visualization as an image."""
@@ -397,6 +593,16 @@ def visualize_network(request_handler=None, query_params=None, body=None):
         return None
     
     try:
+        # The rendering only depends on the topology, so serve it from the cache when it didn't change
+        cache_key = _visualization_key(status)
+        with visualization_cache_lock:
+            png = visualization_cache.get(cache_key)
+            if png is not None:
+                visualization_cache.move_to_end(cache_key)
+        if png is not None:
+            _send_png(request_handler, png)
+            return None
+
         # Create a NetworkX graph from nodes and links
         G = nx.Graph()
         
@@ -419,7 +625,6 @@ def visualize_network(request_handler=None, query_params=None, body=None):
         font_size = 10
         font_color = "white"
         font_weight = "bold"
-        fig_width, fig_height = 24, 8
 
     
         # Define colors based on node type
@@ -472,30 +677,26 @@ def visualize_network(request_handler=None, query_params=None, body=None):
         # Initialize edge color map
         edge_colors = ["black"] * len(G.edges())
 
-        sorted_edges = [tuple(sorted(edge)) for edge in G.edges()]
+        # Map every edge (with sorted endpoints) to its index in G.edges() for O(1) lookups
+        edge_indices = {tuple(sorted(edge)): i for i, edge in enumerate(G.edges())}
 
         # Identify branches and apply the router's color
         for router, color in router_link_colors.items():
             visited = set()
 
             # Perform BFS to traverse each router's branches
-            queue = [(router, None)]
+            queue = deque([(router, None)])
             while queue:
-                current, prev_edge = queue.pop(0)
-                neighbors = G.neighbors(current)
+                current, prev_edge = queue.popleft()
 
-                for neighbor in neighbors:
+                for neighbor in G.neighbors(current):
                     if neighbor not in visited:
                         visited.add(neighbor)
-                        edge = tuple(sorted((current, neighbor))) 
-                        reverse_edge = (neighbor, current)
+                        edge = tuple(sorted((current, neighbor))) # Matches both directions in edge_indices
 
                         # Safely find the edge index
-                        try:
-                            edge_index = sorted_edges.index(edge)
-                            # Apply color to the router's branch
-                            edge_colors[edge_index] = color
-                        except ValueError:
+                        edge_index = edge_indices.get(edge)
+                        if edge_index is None:
                             # Skip coloring if the edge is not found
                             info(f"Edge {edge} not found")
                             continue
@@ -512,9 +713,6 @@ def visualize_network(request_handler=None, query_params=None, body=None):
             for edge in G.edges
         ]
 
-        # Create the visualization
-        plt.figure(figsize=(fig_width, fig_height))
-
         # Assign positions
         pos = {}
 
@@ -549,25 +747,27 @@ def visualize_network(request_handler=None, query_params=None, body=None):
             else:
                 edge_labels[edge_key] = ""
 
-        # Draw nodes and edges with color mapping
-        nx.draw(G, pos, with_labels=True, node_size=700, font_size=10, font_color="white", font_weight="bold", node_color=node_colors, edge_color=edge_colors, width=line_width, style=edge_styles)
-        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=10, font_color="gray")
-        
-        # Save the visualization to a PNG image in memory
         buffer = BytesIO()
-        plt.savefig(buffer, format="png")
-        buffer.seek(0)
-        
+        with plot_lock:
+            # Reuse the figure of the previous rendering instead of allocating a new one
+            ax = VISUALIZATION_AX
+            ax.clear()
+
+            # Draw nodes and edges with color mapping
+            nx.draw(G, pos, ax=ax, with_labels=True, node_size=700, font_size=10, font_color="white", font_weight="bold", node_color=node_colors, edge_color=edge_colors, width=line_width, style=edge_styles)
+            nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=10, font_color="gray", ax=ax)
+
+            # Save the visualization to a PNG image in memory
+            VISUALIZATION_FIG.savefig(buffer, format="png")
+
+        png = buffer.getbuffer().toreadonly() # A view of the rendered image instead of a copy of it
+        with visualization_cache_lock:
+            visualization_cache[cache_key] = png
+            if len(visualization_cache) > VISUALIZATION_CACHE_SIZE:
+                visualization_cache.popitem(last=False) # Evict the least recently used rendering
+
         # Send the image as a response
-        if request_handler:
-            request_handler.send_response(200)
-            request_handler.send_header("Content-Type", "image/png")
-            request_handler.send_header("Connection", "close") # We don't support persistent connections
-            request_handler.end_headers()
-            request_handler.wfile.write(buffer.getvalue())
-
-        # Close the plot to free up memory
-        plt.close()
+        _send_png(request_handler, png)
     except Exception as e:
         # Print the full traceback to the console
         traceback.print_exc()
@@ -594,7 +794,8 @@ def start_xterm(request_handler=None, query_params=None, body=None):
         # Retrieve the node from the Mininet network
         node = net.get(node_name)
         # Start an xterm terminal for the node
-        node.cmd("xterm -ls -xrm 'XTerm*selectToClipboard: true' &")
+        with cmd_lock:
+            node.cmd("xterm -ls -xrm 'XTerm*selectToClipboard: true' &")
 
         if request_handler:
             request_handler._send_response(200, {"message": f"X terminal started for node '{node_name}'"})
@@ -608,6 +809,24 @@ def start_xterm(request_handler=None, query_params=None, body=None):
             request_handler._send_response(500, {"error": str(e)})
         return False
 
+FPING_SUMMARY = re.compile(r"^(\S+)\s+: xmt/rcv/%loss = \d+/(\d+)/", re.MULTILINE)
+
+def _ping_from(src_host, dst_ips):
+    """Ping all dst_ips once from src_host and return the set of addresses that replied."""
+    dst_ips = sorted(dst_ips)
+    if shutil.which("fping"):
+        # A single fping probes every destination in parallel,
+        # its per-target summary (xmt/rcv/%loss) is written to stderr
+        proc = src_host.popen(["fping", "-c1", "-t500", *dst_ips], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        _, summary = proc.communicate()
+        reachable = {match.group(1) for match in FPING_SUMMARY.finditer(summary) if int(match.group(2)) > 0}
+    else:
+        # Fall back to one ping per destination, started together and then awaited
+        procs = {dst_ip: src_host.popen(["ping", "-c", "1", "-W", "1", dst_ip], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) for dst_ip in dst_ips}
+        reachable = {dst_ip for dst_ip, proc in procs.items() if proc.wait() == 0}
+    info(f"Pinged {len(dst_ips)} addresses from {src_host.name}, {len(reachable)} replied")
+    return reachable
+
 @router.route("/ping_all", methods=["GET"])
 def ping_all_interfaces(request_handler=None, query_params=None, body=None):
     """Ping between all possible interfaces on all hosts and return the results."""
@@ -620,48 +839,43 @@ def ping_all_interfaces(request_handler=None, query_params=None, body=None):
     try:
         # Collect all hosts in the network
         hosts = [host for host in net.hosts]
-        ping_results = {}
 
-        # Ping between all pairs of interfaces on different hosts
-        for i, src_host in enumerate(hosts):
-            src_interfaces = [intf for intf in src_host.intfList() if intf.IP() is not None]
-            for j, dst_host in enumerate(hosts):
-                if src_host == dst_host:
-                    continue
-
-                dst_interfaces = [intf for intf in dst_host.intfList() if intf.IP() is not None]
-
-                for src_intf in src_interfaces:
-                    for dst_intf in dst_interfaces:
-                        src_ip = src_intf.IP()
-                        dst_ip = dst_intf.IP()
-
-                        # If source and ip do not start with the same number, skip
-                        # Excpet if one of them is the NAT or starts with 192
-                        src_ip_start = src_ip.split(".")[0]
-                        dst_ip_start = dst_ip.split(".")[0]
-                        if src_ip_start != dst_ip_start and src_ip_start != "192" and dst_ip_start != "192" and src_host.name != "nat0" and dst_host.name != "nat0":
-                            continue
-
-                        # Run ping command and capture output
-                        result = src_host.cmd(f"ping -R -c 1 {dst_ip}")
-
-                        info(f"Pinged from {src_host.name}({src_ip}) to {dst_host.name}({dst_ip})")
-                        print(result)
-                        
-                        # Parse result to determine success or failure
-                        success = "1 packets transmitted, 1 received" in result
-                        result_key = f"{src_host.name}({src_ip}) -> {dst_host.name}({dst_ip})"
+        # Collect every interface with an IP once per host, together with the first part of its address
+        host_intfs = []
+        for host in hosts:
+            ips = [intf.IP() for intf in host.intfList()]
+            host_intfs.append((host, [(ip, ip.partition(".")[0]) for ip in ips if ip is not None]))
+
+        # Collect all pairs of interfaces on different hosts that we want to ping
+        # If source and ip do not start with the same number, skip
+        # Excpet if one of them is the NAT or starts with 192
+        pairs = [
+            (src_host, src_ip, dst_host, dst_ip)
+            for src_host, src_ips in host_intfs
+            for dst_host, dst_ips in host_intfs
+            if src_host != dst_host
+            for src_ip, src_prefix in src_ips
+            for dst_ip, dst_prefix in dst_ips
+            if src_prefix == dst_prefix or "192" in (src_prefix, dst_prefix) or "nat0" in (src_host.name, dst_host.name)
+        ]
 
-                        ping_results[result_key] = {
-                            "ping": "Success" if success else "Failure",
-                        }
+        # Group the destinations by source host, each host pings all of them in one go
+        # The source interface doesn't change the ping itself, the kernel picks the route
+        destinations = {}
+        for src_host, _, _, dst_ip in pairs:
+            destinations.setdefault(src_host, set()).add(dst_ip)
 
-                        
-                            
-                        # Store the traceroute path in the results
-                        #ping_results[result_key]["traceroute"] = traceroute_hops
+        # The hosts live in separate namespaces, so they can all ping at the same time
+        with ThreadPoolExecutor(max_workers=max(1, min(32, len(destinations)))) as executor:
+            reachable = dict(zip(destinations, executor.map(lambda item: _ping_from(*item), destinations.items())))
 
+        ping_results = {}
+        for src_host, src_ip, dst_host, dst_ip in pairs:
+            success = dst_ip in reachable[src_host]
+            result_key = f"{src_host.name}({src_ip}) -> {dst_host.name}({dst_ip})"
+            ping_results[result_key] = {
+                "ping": "Success" if success else "Failure",
+            }
 
         # Send results as JSON response
         if request_handler:
@@ -672,8 +886,38 @@ def ping_all_interfaces(request_handler=None, query_params=None, body=None):
             request_handler._send_response(500, {"error": str(e)})
         return False
 
-def run_server(server_class=HTTPServer, handler_class=RequestHandler, port=5000):
+class PooledHTTPServer(ThreadingHTTPServer):
+    """A threading HTTP server that serves at most max_workers connections at a time.
+    A kept-alive connection holds its slot until the client closes it or it has been
+    idle for RequestHandler.timeout seconds, so max_workers idle keep-alive clients
+    make new connections wait in the listen queue until one of them is freed."""
+    allow_reuse_address = True # Restart right away, even with connections left in TIME_WAIT
+    request_queue_size = 128 # Connections waiting to be accepted, the default of 5 is easily exceeded by polling clients
+    daemon_threads = True # Connections still open on exit, e.g. idle keep-alive ones, don't keep the process alive
+
+    def __init__(self, server_address, handler_class, max_workers=32):
+        super().__init__(server_address, handler_class)
+        self.workers = threading.BoundedSemaphore(max_workers)
+
+    def process_request(self, request, client_address):
+        """Wait for a free slot before starting the connection's thread."""
+        self.workers.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self.workers.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.workers.release()
+
+def run_server(server_class=PooledHTTPServer, handler_class=RequestHandler, port=5000):
     server_address = ('', port)
+    # Connections are served concurrently, so a slow client or a long
+    # streaming /exec no longer blocks the other requests
     httpd = server_class(server_address, handler_class)
     info(f'Starting HTTP server on port {port}...')
 
@@ -681,7 +925,8 @@ def run_server(server_class=HTTPServer, handler_class=RequestHandler, port=5000)
         httpd.serve_forever()
     finally:
         info("Shutting down HTTP server and stopping network...")
-        with lock:
+        httpd.server_close()
+        with lock.write():
             stop_network()  # Ensure the network is stopped on shutdown
 
 def check_smcroute():
@@ -1,6 +1,39 @@
 import re
 from mininet.node import Node
 
+DIGITS = re.compile(r'\d+') # The first number in a node or interface name
+
+# The helpers below build shell commands, run_commands sends a whole list of them to a node at once
+
+def sysctl_command(settings):
+    """A single sysctl call applying a list of 'key=value' kernel settings.
+    Every setting goes on its own continuation line, as the node's terminal limits the length of a line."""
+    return 'sysctl -w ' + ' \\\n'.join(settings)
+
+def ip_batch_command(commands):
+    """A single ip invocation running several ip commands, one command per line of a here-document.
+    -force keeps going after a failing command, like separate ip calls would."""
+    return "ip -force -batch - <<'EOF'\n" + '\n'.join(commands) + '\nEOF'
+
+def wait_smcrouted_command(name, timeout=1.0, interval=0.02):
+    """Wait until the smcrouted daemon of a node answers on its control socket, for at most timeout seconds."""
+    attempts = max(1, int(timeout / interval))
+    return f'for _ in $(seq {attempts}); do smcroutectl -I smcroute-{name} show >/dev/null 2>&1 && break; sleep {interval}; done'
+
+def run_commands(node, commands):
+    """Run a list of shell commands on a node in a single round trip.
+    They are sent as the lines of one { } group, so the shell only returns once all of them ran.
+    There is no set -e, a failing command must not exit the node's shell."""
+    if not commands:
+        return ''
+    return node.cmd('{\n' + '\n'.join(commands) + '\n}')
+
+def ip_batch(node, commands):
+    """Run several ip commands on a node with a single ip invocation."""
+    if not commands:
+        return ''
+    return node.cmd(ip_batch_command(commands))
+
 class LinuxRouter(Node):
 
     # A Node with IP forwarding and multicast enabled
@@ -12,57 +45,73 @@ class LinuxRouter(Node):
         if n_connections is None:
             raise ValueError("Parameter 'n_connections' must be specified for LinuxRouter.")
 
-        # Enable IP forwarding
-        self.cmd('sysctl -w net.ipv4.ip_forward=1')
-        self.cmd('sysctl -w net.ipv6.conf.all.forwarding=1')
-
-        # Do not ignore ICMP echo requests that are broadcasted
-        self.cmd('sysctl -w net.ipv4.icmp_echo_ignore_broadcasts=0')
-        
+        # Look the interfaces and their ip addresses up once, Intf.ip holds the address set when the link was created
+        ips = {intf.name: intf.ip for intf in self.intfList()}
+        intfs = list(ips) # Sorted by port number, like intfNames()
+
+        settings = [
+            # Enable IP forwarding
+            'net.ipv4.ip_forward=1',
+            'net.ipv6.conf.all.forwarding=1',
+            # Do not ignore ICMP echo requests that are broadcasted
+            'net.ipv4.icmp_echo_ignore_broadcasts=0',
+        ]
         # Enable IGMPv2 and disable Reverse Path Filtering for all connected interfaces
-        for intf in self.intfNames():
-            self.cmd(f'sysctl -w net.ipv4.conf.{intf}.force_igmp_version=2')
-            self.cmd(f'sysctl -w net.ipv4.conf.{intf}.rp_filter=0')
+        for intf in intfs:
+            settings.append(f'net.ipv4.conf.{intf}.force_igmp_version=2')
+            settings.append(f'net.ipv4.conf.{intf}.rp_filter=0')
+
+        # The whole configuration runs as one script, in the same order as separate commands would
+        commands = [sysctl_command(settings)]
 
         # Start smcrouted daemon and add multicast routes for each connection
-        self.cmd(f'smcrouted -l debug -I smcroute-{self.name}')
-        self.cmd('sleep 1') # Wait for smcrouted to start
-        for intf in self.intfNames():
+        commands.append(f'smcrouted -l debug -I smcroute-{self.name}')
+        commands.append(wait_smcrouted_command(self.name)) # Wait for smcrouted to start
+        for intf in intfs:
             # Create a list of interfaces, excluding the current one
-            l = [i for i in self.intfNames() if i != intf]
-            # Get the digit of the interface (using regex)
-            i = int(re.search(r'\d+', intf).group())
+            l = [i for i in intfs if i != intf]
+            # Get the digit of the interface (using regex), this is the first number in its name, so the one of the router
+            i = int(DIGITS.search(intf).group())
             # Join the multicast group
-            self.cmd(f'smcroutectl -I smcroute-{self.name} add {intf} 239.0.{i}.1 {" ".join(l)}')
+            commands.append(f'smcroutectl -I smcroute-{self.name} add {intf} 239.0.{i}.1 {" ".join(l)}')
             # Get the ip address of the interface
-            ip = self.intf(intf).IP()
+            ip = ips[intf]
             print(intf, ip)
             # All traffic for X.X.X.m should be routed through this interface
             # eg the ip is 11.0.1.0, then all traffic for 11.0.1.m should be routed through this interface
             # We can do this by adding a route for the /24 subnet
             subnet = '.'.join(ip.split('.')[:3] + ['0'])
-            self.cmd('route add %s/24 dev %s' % (subnet, intf))
-
-        # Accept everything
-        self.cmd('iptables -A INPUT -j ACCEPT')
-        self.cmd('iptables -A FORWARD -j ACCEPT')
-        self.cmd('iptables -A OUTPUT -j ACCEPT')
+            commands.append('route add %s/24 dev %s' % (subnet, intf))
+
+        # Accept everything, appended in a single transaction (--noflush keeps the existing rules)
+        # -w waits for the xtables lock that routers configured in parallel share
+        commands.append("iptables-restore -w --noflush <<'EOF'\n"
+                        '*filter\n'
+                        '-A INPUT -j ACCEPT\n'
+                        '-A FORWARD -j ACCEPT\n'
+                        '-A OUTPUT -j ACCEPT\n'
+                        'COMMIT\n'
+                        'EOF')
+        run_commands(self, commands)
 
     def terminate(self):
-        # Disable IP forwarding
-        self.cmd('sysctl -w net.ipv4.ip_forward=0')
-        self.cmd('sysctl -w net.ipv6.conf.all.forwarding=0')
-
-        # Undo the ICMP, GMP and RPF changes
-        self.cmd('sysctl -w net.ipv4.icmp_echo_ignore_broadcasts=1')
+        settings = [
+            # Disable IP forwarding
+            'net.ipv4.ip_forward=0',
+            'net.ipv6.conf.all.forwarding=0',
+            # Undo the ICMP, GMP and RPF changes
+            'net.ipv4.icmp_echo_ignore_broadcasts=1',
+        ]
         for intf in self.intfNames():
-            self.cmd(f'sysctl -w net.ipv4.conf.{intf}.force_igmp_version=0')
-            self.cmd(f'sysctl -w net.ipv4.conf.{intf}.rp_filter=1')
-
-
-        # Stop smcrouted daemon for this route
-        self.cmd(f'smcroutectl -I smcroute-{self.name} flush')
-        self.cmd(f'smcroutectl -I smcroute-{self.name} kill')
+            settings.append(f'net.ipv4.conf.{intf}.force_igmp_version=0')
+            settings.append(f'net.ipv4.conf.{intf}.rp_filter=1')
+
+        run_commands(self, [
+            sysctl_command(settings),
+            # Stop smcrouted daemon for this route
+            f'smcroutectl -I smcroute-{self.name} flush',
+            f'smcroutectl -I smcroute-{self.name} kill',
+        ])
         super(LinuxRouter, self).terminate()
 
 class EdgeNode(Node):
@@ -75,55 +124,61 @@ class EdgeNode(Node):
             raise ValueError("Parameter 'n_nodes' must be specified for LinuxRouter.")
 
         # Get the node number
-        nodeNumber = int(re.search(r'\d+', self.name).group())
-
-        # Enable ICMP echo requests that are broadcasted
-        self.cmd('sysctl net.ipv4.icmp_echo_ignore_broadcasts=0')
-        # Add multicast route for the interface
-        for intfName in self.intfNames():
+        nodeNumber = int(DIGITS.search(self.name).group())
+
+        # Look the interfaces and their ip addresses up once, Intf.ip holds the address set when the link was created
+        ips = {intf.name: intf.ip for intf in self.intfList()}
+        intfs = list(ips) # Sorted by port number, like intfNames()
+
+        # The other edge nodes' subnets are the same for every interface.
+        # The interface names are known when the topology is built (Topo.addLink assigns
+        # the ports), but the script is still generated here: it is built in one pass and
+        # sent in one round trip, so generating it costs little next to running it
+        other_nodes = [n for n in range(0, n_nodes + 1) if n != nodeNumber]
+
+        # One pass over the interfaces collects the commands for before and after smcrouted starts
+        multicast_routes = [] # Added before smcrouted starts
+        joins = [] # Need a running smcrouted
+        routes = [] # Installed with a single ip -batch call
+        for intfName in intfs:
             # Get the IP address of the interface
-            ip = self.intf(intfName).IP()
+            ip = ips[intfName]
             ip_first_part = ip.split('.')[0]
             router_ip = '.'.join([f'{ip_first_part}', '0', f'{nodeNumber}', '1'])
             # Get the router number
             router_number = int(ip_first_part) - 10
             # Add a route for the multicast group
-            self.cmd(f'route add -net 239.0.{router_number}.0 netmask 255.255.255.0 dev {intfName}')
+            multicast_routes.append(f'route add -net 239.0.{router_number}.0 netmask 255.255.255.0 dev {intfName}')
             # TODO: Check if the above route is necessary
-        # Start smcrouted daemon and join the multicast group
-        self.cmd(f'smcrouted -l debug -I smcroute-{self.name}')
-        self.cmd('sleep 1') # Wait for smcrouted to start
-        # Join the multicast group for each interface
-        for intfName in self.intfNames():
-            # Get the IP address of the interface
-            ip = self.intf(intfName).IP()
-            ip_first_part = ip.split('.')[0]
-            router_ip = '.'.join([f'{ip_first_part}', '0', f'{nodeNumber}', '1'])
-            # Get the router number
-            router_number = int(ip_first_part) - 10
             # Join the multicast group
-            self.cmd(f'smcroutectl -I smcroute-{self.name} join {intfName} 239.0.{router_number}.1')
+            joins.append(f'smcroutectl -I smcroute-{self.name} join {intfName} 239.0.{router_number}.1')
             # Route all traffic for the multicast group through the interface
-            self.cmd(f'ip route add 239.0.{router_number}.0/24 via {router_ip} dev {intfName}')
-            # Generate routes for other subnets based on `n_nodes`
-            for n in range(0, n_nodes + 1):
-                if n == nodeNumber:
-                    continue
-                subnet = '.'.join([f'{ip_first_part}', '0', f'{n}', '0'])
-                # Add route for each subnet
-                self.cmd(f'ip route add {subnet}/24 via {router_ip} dev {intfName}')
+            routes.append(f'route add 239.0.{router_number}.0/24 via {router_ip} dev {intfName}')
+            # Generate routes for other subnets based on `n_nodes`, a route for each subnet
+            routes += [f'route add {ip_first_part}.0.{n}.0/24 via {router_ip} dev {intfName}' for n in other_nodes]
 
-
-        self.cmd(f'ip route add default via 11.0.{nodeNumber}.1')
-            
+        # The whole configuration runs as one script, in the same order as separate commands would
+        # Enable ICMP echo requests that are broadcasted
+        commands = [sysctl_command(['net.ipv4.icmp_echo_ignore_broadcasts=0'])]
+        # Add multicast route for the interface
+        commands += multicast_routes
+        # Start smcrouted daemon and join the multicast group
+        commands.append(f'smcrouted -l debug -I smcroute-{self.name}')
+        commands.append(wait_smcrouted_command(self.name)) # Wait for smcrouted to start
+        # Join the multicast group for each interface
+        commands += joins
+        routes.append(f'route add default via 11.0.{nodeNumber}.1')
+        commands.append(ip_batch_command(routes))
+        run_commands(self, commands)
 
 
     def terminate(self):
-        # Stop smcrouted daemon route for this node
-        self.cmd(f'smcroutectl -I smcroute-{self.name} flush')
-        self.cmd(f'smcroutectl -I smcroute-{self.name} kill')
-
-        # Undo the ICMP changes
-        self.cmd('sysctl net.ipv4.icmp_echo_ignore_broadcasts=1')
+        run_commands(self, [
+            # Stop smcrouted daemon route for this node
+            f'smcroutectl -I smcroute-{self.name} flush',
+            f'smcroutectl -I smcroute-{self.name} kill',
+            # Undo the ICMP changes
+            sysctl_command(['net.ipv4.icmp_echo_ignore_broadcasts=1']),
+        ])
 
         super(EdgeNode, self).terminate()
\ No newline at end of file
@@ -1,11 +1,40 @@
 #!/usr/bin/python
 
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from mininet.log import info
+from mininet.net import Mininet
 from mininet.topo import Topo
 from mininet.node import Node
 from mininet.nodelib import NAT
 
 from nodes import LinuxRouter, EdgeNode
 
+class ParallelMininet(Mininet):
+    # A Mininet network that configures its hosts concurrently, every host has its own shell
+
+    def configHosts(self):
+        """Configure a set of hosts, the ones in their own namespace in parallel."""
+        # Hosts in the root namespace (the NAT) change the host's shared state, so they go first
+        shared = [host for host in self.hosts if not host.inNamespace]
+        isolated = [host for host in self.hosts if host.inNamespace]
+        for host in shared:
+            self.configHost(host)
+        if isolated:
+            with ThreadPoolExecutor(max_workers=min(32, len(isolated))) as executor:
+                list(executor.map(self.configHost, isolated)) # Re-raises the first configuration error
+        info('\n')
+
+    def configHost(self, host):
+        """Configure a single host, like Mininet.configHosts does for each of them."""
+        info(host.name + ' ')
+        if host.defaultIntf():
+            host.configDefault()
+        else:
+            # Don't configure nonexistent intf
+            host.configDefault(ip=None, mac=None)
+
 class NetworkTopo(Topo):
     # Simplified topology with a server, router, and client
     def build(self, n_nodes=2, n_paths=2, **params):
@@ -17,7 +46,11 @@ class NetworkTopo(Topo):
 
         # Store the routers in a list for easy access
         routers = []
-        switch_count = 0
+        switch_ids = itertools.count() # Switches are named s0, s1, ... in the order they are created
+        # The first octet of the addresses on the links of each router, r1 (the NAT router) uses 11, r2 uses 12, ...
+        first_octets = tuple(10 + 1 + j for j in range(n_paths + 1))
+        # The loop invariant start of the addresses on the links between the edge nodes and each router
+        router_prefixes = tuple('%d.0.' % octet for octet in first_octets)
 
         # NAT connection for internet access
         nat = self.addHost('nat0', cls=NAT, ip=f'11.0.{n_nodes+1}.2', subnet='11.0/8', inNamespace=False)
@@ -26,8 +59,7 @@ class NetworkTopo(Topo):
         # Store the NAT router in our list
         routers.append(nat_router)
         # NAT Switch connected to NAT node and NAT router for internet access
-        nat_switch = self.addSwitch(f's{switch_count}')
-        switch_count += 1
+        nat_switch = self.addSwitch('s%d' % next(switch_ids))
         self.addLink(nat, nat_switch) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
 
         # Create one router per path
@@ -39,13 +71,14 @@ class NetworkTopo(Topo):
         for i in range(1, n_nodes+1):
             edge_node = self.addHost(f'n{i}', cls=EdgeNode, ip=f'11.0.{i}.2/24', defaultRoute='via 11.0.{i}.1', n_nodes=n_nodes)
 
+            node_suffix = str(i)
             # Iterate over the routers and connect the edge node to each of them
-            for j, router in enumerate(routers):
+            for router, prefix in zip(routers, router_prefixes):
                 # Create a switch to connect the edge node to the router
-                switch = self.addSwitch(f's{switch_count}')
-                switch_count += 1
-                edge_ip = f'{10 + 1 + j}.0.{i}.2'
-                router_ip = f'{10 + 1 + j}.0.{i}.1'
+                switch = self.addSwitch('s%d' % next(switch_ids))
+                subnet = prefix + node_suffix
+                edge_ip = subnet + '.2'
+                router_ip = subnet + '.1'
                 self.addLink(edge_node, switch, params1={'ip':f'{edge_ip}/24'}) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
                 self.addLink(switch, router, params2={'ip':f'{router_ip}/24'}) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
                 #self.addLink(switch, router)
@@ -57,8 +90,7 @@ class NetworkTopo(Topo):
         for i, router in enumerate(routers):
             if i == 0:
                 continue
-            switch = self.addSwitch(f's{switch_count}')
-            switch_count += 1
-            self.addLink(router, switch, params1={'ip':f'11.{10 + 1 + i}.1.2/24'}) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
-            self.addLink(switch, nat_router, params2={'ip':f'11.{10 + 1 + i}.1.1/24'}) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
+            switch = self.addSwitch('s%d' % next(switch_ids))
+            self.addLink(router, switch, params1={'ip':'11.%d.1.2/24' % first_octets[i]}) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
+            self.addLink(switch, nat_router, params2={'ip':'11.%d.1.1/24' % first_octets[i]}) #, bw=4000, max_queue_size=5000, use_hfsc=True)   # 4000 Mbps link
             
\ No newline at end of file
@@ -1,15 +1,22 @@
 import os
-import platform
+import sys
+import stat
 import difflib
 import argparse
 
+try:
+    from rapidfuzz import fuzz, process  # Optional, a much faster fuzzy matcher than difflib
+except ImportError:
+    process = None
+
+COPY_BUFFER_SIZE = 65536  # Size of the buffer file contents are copied through
+
 
 def clear_screen():
-    """Clear the terminal screen."""
-    if platform.system() == "Windows":
-        os.system("cls")
-    else:
-        os.system("clear")
+    """Clear the terminal screen, without starting a shell. Output that is redirected is left alone."""
+    if sys.stdout.isatty():
+        sys.stdout.write("\x1b[2J\x1b[H")  # ANSI erase display and move the cursor home
+        sys.stdout.flush()
 
 
 def suggest_directories(base_dir):
@@ -21,20 +28,109 @@ def suggest_directories(base_dir):
     """
     parent_dir = os.path.dirname(base_dir) or "."
     if os.path.exists(parent_dir):
-        all_dirs = [d for d in os.listdir(parent_dir) if os.path.isdir(os.path.join(parent_dir, d))]
-        suggestions = difflib.get_close_matches(os.path.basename(base_dir), all_dirs, n=3)
+        with os.scandir(parent_dir) as it:
+            all_dirs = [entry.name for entry in it if entry.is_dir()]
+        name = os.path.basename(base_dir)
+        if process:
+            # Same limit and cutoff as the difflib defaults
+            matches = process.extract(name, all_dirs, scorer=fuzz.ratio, limit=3, score_cutoff=60)
+            suggestions = [match for match, _, _ in matches]
+        else:
+            suggestions = difflib.get_close_matches(name, all_dirs, n=3)
         return [os.path.join(parent_dir, s) for s in suggestions]
     return []
 
 
+def walk_files(base_dir):
+    """
+    Walk a directory tree top-down with os.scandir, in the same order as os.walk.
+    Symbolic links to directories are listed but not followed, unreadable directories are skipped.
+
+    :param base_dir: The directory to walk.
+    :return: A generator of (directory, file names) tuples.
+    """
+    try:
+        with os.scandir(base_dir) as it:
+            entries = list(it)
+    except OSError:
+        return
+
+    files = []
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            files.append(entry.name)
+        elif not entry.is_symlink():
+            subdirs.append(entry.path)
+
+    yield base_dir, files
+    for subdir in subdirs:
+        yield from walk_files(subdir)
+
+
+def can_sendfile(out):
+    """
+    Check whether file contents can be copied to an output stream with os.sendfile.
+
+    :param out: The binary output stream.
+    :return: True if the stream is backed by a regular file or a pipe.
+    """
+    if not hasattr(os, "sendfile"):
+        return False
+    try:
+        mode = os.fstat(out.fileno()).st_mode
+    except (OSError, ValueError, AttributeError):
+        return False  # E.g. a stream without a file descriptor
+    return stat.S_ISREG(mode) or stat.S_ISFIFO(mode)
+
+
+def copy_content(f, out, max_length, buffer, use_sendfile):
+    """
+    Copy the start of an open file to an output stream, without holding the whole content in memory.
+
+    :param f: The file to copy from, opened in binary mode.
+    :param out: The binary output stream, flushed before sendfile writes to its file descriptor.
+    :param max_length: Maximum number of bytes to copy.
+    :param buffer: A reusable memoryview that the content is copied through.
+    :param use_sendfile: Let the kernel copy the content directly with os.sendfile.
+    :return: The number of bytes copied.
+    """
+    copied = 0
+    if use_sendfile:
+        out.flush()
+        try:
+            while copied < max_length:
+                sent = os.sendfile(out.fileno(), f.fileno(), copied, max_length - copied)
+                if not sent:
+                    return copied
+                copied += sent
+            return copied
+        except OSError:
+            if copied:
+                raise
+            # Not supported for this pair of files, copy through the buffer instead
+
+    while copied < max_length:
+        read = f.readinto(buffer[:min(len(buffer), max_length - copied)])
+        if not read:
+            break
+        out.write(buffer[:read])
+        copied += read
+    return copied
+
+
 def list_files_with_content(base_dir, file_extension=None, max_content_length=1024):
     """
     List all files in a directory and its subdirectories, sorted and grouped by directory.
     Prints the content of each file.
 
     :param base_dir: The base directory to search for files.
-    :param file_extension: File extension to filter (e.g., '.txt'), or None to include all files.
-    :param max_content_length: Maximum length of content to print per file (to prevent excessive output).
+    :param file_extension: File extension to filter (e.g., '.txt'), a list of them, or None to include all files.
+    :param max_content_length: Maximum number of bytes to print per file (to prevent excessive output).
     """
     clear_screen()  # Clear the screen at the start
 
@@ -49,31 +145,49 @@ def list_files_with_content(base_dir, file_extension=None, max_content_length=10
             print("\nNo similar directories found.")
         return
 
-    for root, _, files in os.walk(base_dir):
+    # str.endswith accepts a tuple, so any number of extensions is a single call per file
+    if isinstance(file_extension, str):
+        extensions = (file_extension,)
+    else:
+        extensions = tuple(file_extension) if file_extension else None
+
+    # File contents are copied as raw bytes, so nothing is decoded and encoded again
+    sys.stdout.flush()
+    out = sys.stdout.buffer
+    use_sendfile = can_sendfile(out)
+    buffer = memoryview(bytearray(COPY_BUFFER_SIZE))
+
+    for root, files in walk_files(base_dir):
         # Filter files by extension if provided
-        if file_extension:
-            files = [f for f in files if f.endswith(file_extension)]
+        if extensions:
+            files = [f for f in files if f.endswith(extensions)]
 
         # Sort files
         files.sort()
 
         if files:  # Only print directories containing files
-            print(f"\nDirectory: {root}")
-            print("-" * (len(root) + 11))
+            # The headers of this directory are collected and written together with the next file content
+            chunks = [b"\nDirectory: ", os.fsencode(root), b"\n", b"-" * (len(root) + 11), b"\n"]
 
             for file in files:
                 file_path = os.path.join(root, file)
-                print(f"File: {file}")
-                print("-" * (len(file) + 6))
+                separator = b"-" * (len(file) + 6) + b"\n"
+                chunks += (b"File: ", os.fsencode(file), b"\n", separator)
                 try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read(max_content_length)
-                        print(content)
-                        if len(content) == max_content_length:
-                            print("\n[Content truncated...]\n")
+                    with open(file_path, 'rb', buffering=0) as f:
+                        # The content is streamed, so what comes before it is written first
+                        out.writelines(chunks)
+                        chunks.clear()
+                        copied = copy_content(f, out, max_content_length, buffer, use_sendfile)
+                        chunks.append(b"\n")
+                        if copied == max_content_length:
+                            chunks.append(b"\n[Content truncated...]\n\n")
                 except Exception as e:
-                    print(f"Error reading file: {e}")
-                print("-" * (len(file) + 6) + "\n")
+                    chunks.append(f"Error reading file: {e}\n".encode())
+                chunks += (separator, b"\n")
+
+            out.writelines(chunks)
+    out.flush()
 
 
 if __name__ == "__main__":
@@ -83,17 +197,20 @@ if __name__ == "__main__":
     parser.add_argument(
         "--extension",
         default=None,
-        help="File extension to filter (e.g., '.txt'). If not provided, includes all files."
+        help="File extension(s) to filter, comma separated (e.g., '.txt' or '.py,.md'). If not provided, includes all files."
     )
     parser.add_argument(
         "--max_content_length",
         type=int,
         default=131072,
-        help="Maximum number of characters to display from each file."
+        help="Maximum number of bytes to display from each file."
     )
 
     args = parser.parse_args()
 
+    # Several extensions are given as one comma separated argument, so the option can't swallow the base directory
+    extensions = args.extension.split(",") if args.extension else None
+
     # Call the function with the provided arguments
-    list_files_with_content(args.base_directory, args.extension, args.max_content_length)
+    list_files_with_content(args.base_directory, extensions, args.max_content_length)
 